@@ -0,0 +1,21 @@
+-- Adds the MCP server lookup indexes to a database created from an older schema.sql.
+-- CONCURRENTLY cannot run inside a transaction, so apply this file with plain psql:
+--   psql -h localhost -p 15432 -U postgres -d invoices -f data/migrations/001_lookup_indexes.sql
+
+-- supplier_id / status filters and per-supplier aggregates (index-only scans)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_supplier_status ON invoices (supplier_id, status)
+    INCLUDE (total_amount, invoice_date, currency_code);
+
+-- lookup_invoice by number (the UNIQUE (supplier_id, invoice_number) index leads with supplier_id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_invoice_number ON invoices (invoice_number);
+
+-- query_amounts min_amount / max_amount range filters
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_total_amount ON invoices (total_amount);
+
+-- Per-supplier PO aggregates (po_number is already indexed by its UNIQUE constraint)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_purchase_orders_supplier ON purchase_orders (supplier_id)
+    INCLUDE (currency_code, total_amount);
+
+-- invoice_balances view joins allocations by invoice_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payment_allocations_invoice ON payment_allocations (invoice_id)
+    INCLUDE (allocated_amount);
@@ -0,0 +1,97 @@
+-- Adds the incrementally maintained vendor_invoice_summary table used by
+-- get_vendor_summary to an existing database. Also removes vendor_summary_mv
+-- and its refresh trigger if an earlier version of this migration created them.
+--   psql -h localhost -p 15432 -U postgres -d invoices -f data/migrations/002_vendor_invoice_summary.sql
+
+BEGIN;
+
+DROP TRIGGER IF EXISTS invoices_refresh_vendor_summary_mv ON invoices;
+DROP FUNCTION IF EXISTS refresh_vendor_summary_mv();
+DROP MATERIALIZED VIEW IF EXISTS vendor_summary_mv;
+
+CREATE TABLE IF NOT EXISTS vendor_invoice_summary (
+    supplier_id          BIGINT        NOT NULL,
+    currency_code        CHAR(3)       NOT NULL,
+    invoice_count        BIGINT        NOT NULL,
+    total_invoiced       NUMERIC       NOT NULL,
+    total_paid           NUMERIC       NOT NULL,
+    outstanding          NUMERIC       GENERATED ALWAYS AS (total_invoiced - total_paid) STORED,
+    PRIMARY KEY (supplier_id, currency_code)
+);
+
+CREATE OR REPLACE FUNCTION vendor_invoice_summary_apply() RETURNS trigger
+SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE vendor_invoice_summary
+        SET invoice_count = invoice_count - 1,
+            total_invoiced = total_invoiced - OLD.total_amount,
+            total_paid = total_paid - CASE WHEN OLD.status = 'PAID' THEN OLD.total_amount ELSE 0 END
+        WHERE supplier_id = OLD.supplier_id AND currency_code = OLD.currency_code;
+
+        DELETE FROM vendor_invoice_summary
+        WHERE supplier_id = OLD.supplier_id AND currency_code = OLD.currency_code
+          AND invoice_count = 0;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO vendor_invoice_summary AS v
+            (supplier_id, currency_code, invoice_count, total_invoiced, total_paid)
+        VALUES (NEW.supplier_id, NEW.currency_code, 1, NEW.total_amount,
+                CASE WHEN NEW.status = 'PAID' THEN NEW.total_amount ELSE 0 END)
+        ON CONFLICT (supplier_id, currency_code) DO UPDATE
+        SET invoice_count = v.invoice_count + 1,
+            total_invoiced = v.total_invoiced + EXCLUDED.total_invoiced,
+            total_paid = v.total_paid + EXCLUDED.total_paid;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION vendor_invoice_summary_truncate() RETURNS trigger
+SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    TRUNCATE vendor_invoice_summary;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS invoices_vendor_summary_insert_delete ON invoices;
+CREATE CONSTRAINT TRIGGER invoices_vendor_summary_insert_delete
+AFTER INSERT OR DELETE ON invoices
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION vendor_invoice_summary_apply();
+
+-- Only changes to the aggregated columns touch the summary
+DROP TRIGGER IF EXISTS invoices_vendor_summary_update ON invoices;
+CREATE CONSTRAINT TRIGGER invoices_vendor_summary_update
+AFTER UPDATE OF supplier_id, currency_code, status, total_amount ON invoices
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW
+WHEN (OLD.supplier_id IS DISTINCT FROM NEW.supplier_id
+      OR OLD.currency_code IS DISTINCT FROM NEW.currency_code
+      OR OLD.status IS DISTINCT FROM NEW.status
+      OR OLD.total_amount IS DISTINCT FROM NEW.total_amount)
+EXECUTE FUNCTION vendor_invoice_summary_apply();
+
+-- Constraint triggers cannot fire on TRUNCATE, so this one runs immediately
+DROP TRIGGER IF EXISTS invoices_vendor_summary_truncate ON invoices;
+CREATE TRIGGER invoices_vendor_summary_truncate
+AFTER TRUNCATE ON invoices
+FOR EACH STATEMENT EXECUTE FUNCTION vendor_invoice_summary_truncate();
+
+-- Block invoice writers while the summary is rebuilt from current rows
+LOCK TABLE invoices IN SHARE MODE;
+TRUNCATE vendor_invoice_summary;
+INSERT INTO vendor_invoice_summary (supplier_id, currency_code, invoice_count, total_invoiced, total_paid)
+SELECT
+    supplier_id,
+    currency_code,
+    COUNT(*),
+    SUM(total_amount),
+    SUM(CASE WHEN status = 'PAID' THEN total_amount ELSE 0 END)
+FROM invoices
+GROUP BY supplier_id, currency_code;
+
+COMMIT;
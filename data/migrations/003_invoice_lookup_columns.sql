@@ -0,0 +1,65 @@
+-- Denormalizes supplier_name and po_number onto invoices and adds a covering
+-- invoice_number index, so lookup_invoice reads a single index.
+-- CONCURRENTLY cannot run inside a transaction, so apply this file with plain psql:
+--   psql -h localhost -p 15432 -U postgres -d invoices -f data/migrations/003_invoice_lookup_columns.sql
+
+BEGIN;
+
+ALTER TABLE invoices
+    ADD COLUMN IF NOT EXISTS supplier_name TEXT,
+    ADD COLUMN IF NOT EXISTS po_number TEXT;
+
+CREATE OR REPLACE FUNCTION invoices_fill_lookup_columns() RETURNS trigger
+SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    SELECT name INTO NEW.supplier_name FROM suppliers WHERE supplier_id = NEW.supplier_id;
+    SELECT po_number INTO NEW.po_number FROM purchase_orders WHERE po_id = NEW.po_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS invoices_fill_lookup_columns ON invoices;
+CREATE TRIGGER invoices_fill_lookup_columns
+BEFORE INSERT OR UPDATE OF supplier_id, po_id, supplier_name, po_number ON invoices
+FOR EACH ROW EXECUTE FUNCTION invoices_fill_lookup_columns();
+
+CREATE OR REPLACE FUNCTION suppliers_sync_invoice_names() RETURNS trigger
+SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    UPDATE invoices SET supplier_name = NEW.name WHERE supplier_id = NEW.supplier_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS suppliers_sync_invoice_names ON suppliers;
+CREATE TRIGGER suppliers_sync_invoice_names
+AFTER UPDATE OF name ON suppliers
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION suppliers_sync_invoice_names();
+
+CREATE OR REPLACE FUNCTION purchase_orders_sync_invoice_po_numbers() RETURNS trigger
+SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    UPDATE invoices SET po_number = NEW.po_number WHERE po_id = NEW.po_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS purchase_orders_sync_invoice_po_numbers ON purchase_orders;
+CREATE TRIGGER purchase_orders_sync_invoice_po_numbers
+AFTER UPDATE OF po_number ON purchase_orders
+FOR EACH ROW WHEN (OLD.po_number IS DISTINCT FROM NEW.po_number)
+EXECUTE FUNCTION purchase_orders_sync_invoice_po_numbers();
+
+-- Backfill existing rows
+UPDATE invoices i
+SET supplier_name = (SELECT s.name FROM suppliers s WHERE s.supplier_id = i.supplier_id),
+    po_number = (SELECT po.po_number FROM purchase_orders po WHERE po.po_id = i.po_id);
+
+COMMIT;
+
+-- Replaces idx_invoices_invoice_number from 001_lookup_indexes.sql
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_invoice_number_lookup ON invoices (invoice_number)
+    INCLUDE (invoice_id, invoice_date, due_date, currency_code, status, subtotal_amount,
+             tax_amount, total_amount, supplier_id, supplier_name, po_number);
+DROP INDEX CONCURRENTLY IF EXISTS idx_invoices_invoice_number;
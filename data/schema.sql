@@ -39,6 +39,8 @@ CREATE TABLE invoices (
     supplier_id          BIGINT      NOT NULL REFERENCES suppliers(supplier_id),
     po_id                BIGINT      REFERENCES purchase_orders(po_id),
     invoice_number       TEXT        NOT NULL,
+    supplier_name        TEXT,       -- copy of suppliers.name, maintained by trigger
+    po_number            TEXT,       -- copy of purchase_orders.po_number, maintained by trigger
     invoice_date         DATE        NOT NULL,
     due_date             DATE        NOT NULL,
     currency_code        CHAR(3)     NOT NULL DEFAULT 'USD',
@@ -107,4 +109,135 @@ FROM suppliers s
 JOIN invoice_balances v ON v.invoice_id IN (
     SELECT invoice_id FROM invoices WHERE supplier_id = s.supplier_id AND status <> 'PAID'
 )
-GROUP BY s.supplier_id, s.name;
\ No newline at end of file
+GROUP BY s.supplier_id, s.name;
+
+-- Indexes matching the MCP server's lookup predicates
+-- (keep in sync with data/migrations/001_lookup_indexes.sql and 003_invoice_lookup_columns.sql)
+CREATE INDEX idx_invoices_supplier_status ON invoices (supplier_id, status)
+    INCLUDE (total_amount, invoice_date, currency_code);
+-- Covers every column lookup_invoice returns, so it is served by an index-only scan
+CREATE INDEX idx_invoices_invoice_number_lookup ON invoices (invoice_number)
+    INCLUDE (invoice_id, invoice_date, due_date, currency_code, status, subtotal_amount,
+             tax_amount, total_amount, supplier_id, supplier_name, po_number);
+CREATE INDEX idx_invoices_total_amount ON invoices (total_amount);
+CREATE INDEX idx_purchase_orders_supplier ON purchase_orders (supplier_id)
+    INCLUDE (currency_code, total_amount);
+CREATE INDEX idx_payment_allocations_invoice ON payment_allocations (invoice_id)
+    INCLUDE (allocated_amount);
+
+
+-- Per-supplier invoice totals for get_vendor_summary, maintained by the triggers below
+-- (keep in sync with data/migrations/002_vendor_invoice_summary.sql)
+CREATE TABLE vendor_invoice_summary (
+    supplier_id          BIGINT        NOT NULL,
+    currency_code        CHAR(3)       NOT NULL,
+    invoice_count        BIGINT        NOT NULL,
+    total_invoiced       NUMERIC       NOT NULL,
+    total_paid           NUMERIC       NOT NULL,
+    outstanding          NUMERIC       GENERATED ALWAYS AS (total_invoiced - total_paid) STORED,
+    PRIMARY KEY (supplier_id, currency_code)
+);
+
+CREATE FUNCTION vendor_invoice_summary_apply() RETURNS trigger
+SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE vendor_invoice_summary
+        SET invoice_count = invoice_count - 1,
+            total_invoiced = total_invoiced - OLD.total_amount,
+            total_paid = total_paid - CASE WHEN OLD.status = 'PAID' THEN OLD.total_amount ELSE 0 END
+        WHERE supplier_id = OLD.supplier_id AND currency_code = OLD.currency_code;
+
+        DELETE FROM vendor_invoice_summary
+        WHERE supplier_id = OLD.supplier_id AND currency_code = OLD.currency_code
+          AND invoice_count = 0;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO vendor_invoice_summary AS v
+            (supplier_id, currency_code, invoice_count, total_invoiced, total_paid)
+        VALUES (NEW.supplier_id, NEW.currency_code, 1, NEW.total_amount,
+                CASE WHEN NEW.status = 'PAID' THEN NEW.total_amount ELSE 0 END)
+        ON CONFLICT (supplier_id, currency_code) DO UPDATE
+        SET invoice_count = v.invoice_count + 1,
+            total_invoiced = v.total_invoiced + EXCLUDED.total_invoiced,
+            total_paid = v.total_paid + EXCLUDED.total_paid;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION vendor_invoice_summary_truncate() RETURNS trigger
+SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    TRUNCATE vendor_invoice_summary;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER invoices_vendor_summary_insert_delete
+AFTER INSERT OR DELETE ON invoices
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION vendor_invoice_summary_apply();
+
+-- Only changes to the aggregated columns touch the summary
+CREATE CONSTRAINT TRIGGER invoices_vendor_summary_update
+AFTER UPDATE OF supplier_id, currency_code, status, total_amount ON invoices
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW
+WHEN (OLD.supplier_id IS DISTINCT FROM NEW.supplier_id
+      OR OLD.currency_code IS DISTINCT FROM NEW.currency_code
+      OR OLD.status IS DISTINCT FROM NEW.status
+      OR OLD.total_amount IS DISTINCT FROM NEW.total_amount)
+EXECUTE FUNCTION vendor_invoice_summary_apply();
+
+-- Constraint triggers cannot fire on TRUNCATE, so this one runs immediately
+CREATE TRIGGER invoices_vendor_summary_truncate
+AFTER TRUNCATE ON invoices
+FOR EACH STATEMENT EXECUTE FUNCTION vendor_invoice_summary_truncate();
+
+
+-- Keep invoices.supplier_name and invoices.po_number in sync with their sources
+-- (keep in sync with data/migrations/003_invoice_lookup_columns.sql). The
+-- functions are SECURITY DEFINER, so renaming a supplier or PO needs no UPDATE
+-- privilege on invoices. Their UPDATEs only touch supplier_name and po_number,
+-- so they never fire the vendor_invoice_summary triggers above.
+CREATE FUNCTION invoices_fill_lookup_columns() RETURNS trigger
+SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    SELECT name INTO NEW.supplier_name FROM suppliers WHERE supplier_id = NEW.supplier_id;
+    SELECT po_number INTO NEW.po_number FROM purchase_orders WHERE po_id = NEW.po_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER invoices_fill_lookup_columns
+BEFORE INSERT OR UPDATE OF supplier_id, po_id, supplier_name, po_number ON invoices
+FOR EACH ROW EXECUTE FUNCTION invoices_fill_lookup_columns();
+
+CREATE FUNCTION suppliers_sync_invoice_names() RETURNS trigger
+SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    UPDATE invoices SET supplier_name = NEW.name WHERE supplier_id = NEW.supplier_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER suppliers_sync_invoice_names
+AFTER UPDATE OF name ON suppliers
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION suppliers_sync_invoice_names();
+
+CREATE FUNCTION purchase_orders_sync_invoice_po_numbers() RETURNS trigger
+SECURITY DEFINER SET search_path = public, pg_temp AS $$
+BEGIN
+    UPDATE invoices SET po_number = NEW.po_number WHERE po_id = NEW.po_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER purchase_orders_sync_invoice_po_numbers
+AFTER UPDATE OF po_number ON purchase_orders
+FOR EACH ROW WHEN (OLD.po_number IS DISTINCT FROM NEW.po_number)
+EXECUTE FUNCTION purchase_orders_sync_invoice_po_numbers();
@@ -5,10 +5,19 @@ Provides tools to query invoice, purchase order, vendor, and payment data from P
 """
 
 import os
+import sys
+import atexit
 import asyncio
-from typing import Any
+import threading
+import orjson
+from decimal import Decimal
+from functools import partial
+from json import loads as json_loads
+from typing import Any, Iterable, Iterator
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import connection as PGConnection
+from psycopg2.extras import RealDictCursor, execute_values, register_default_json
+from psycopg2.pool import ThreadedConnectionPool
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
 from mcp.server.stdio import stdio_server
@@ -22,133 +31,420 @@ DB_CONFIG = {
     "database": os.getenv("POSTGRES_DATABASE", "invoices"),
     "user": os.getenv("POSTGRES_USER", "postgres"),
     "password": os.getenv("POSTGRES_PASSWORD", "P@ssw0rd!"),
+    "application_name": "mcp-postgres-lookup",
+    # TCP keepalives so idle pooled connections aren't silently dropped
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 3,
+    # Stop a runaway query from holding a pooled connection indefinitely
+    "options": f"-c statement_timeout={int(os.getenv('PG_STATEMENT_TIMEOUT_MS', '10000'))}",
 }
 
 
+# Decode JSON aggregates with Decimal so amounts keep their NUMERIC precision
+register_default_json(globally=True, loads=partial(json_loads, parse_float=Decimal))
+
+
+# Connection pool sizing
+POOL_MIN_CONN = 2
+POOL_MAX_CONN = int(os.getenv("PG_POOL_MAX", "20"))
+
+_pool: ThreadedConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+# Bounds concurrent worker-thread queries so the pool is never exhausted
+_pool_slots = asyncio.Semaphore(POOL_MAX_CONN)
+
+# Separators used in text responses
+ROW_SEPARATOR = "-" * 50 + "\n"
+HEADER_SEPARATOR = "=" * 50 + "\n"
+
+# Tool response formats; compact JSON is cheaper to build and for LLM clients to read
+RESPONSE_FORMATS = ("json", "text")
+DEFAULT_RESPONSE_FORMAT = "json"
+
+# Default cap on rows returned by list-style tools
+DEFAULT_ROW_LIMIT = 500
+
+# Multi-key lookups, shared by the array-parameter and temp-table paths.
+# {key_filter} is filled with ARRAY_KEY_FILTER or TEMP_TABLE_KEY_FILTER.
+MULTI_KEY_LOOKUPS = {
+    # supplier_name and po_number are kept on invoices by triggers, and
+    # idx_invoices_invoice_number_lookup covers every selected column
+    "invoices_by_number": """
+        SELECT i.invoice_id, i.invoice_number, i.invoice_date, i.due_date,
+               i.currency_code, i.status, i.subtotal_amount, i.tax_amount, 
+               i.total_amount, i.supplier_name, i.supplier_id, i.po_number
+        FROM invoices i
+        WHERE i.invoice_number {key_filter}
+        ORDER BY i.invoice_date DESC
+    """,
+    "purchase_orders_by_number": """
+        SELECT po.po_id, po.po_number, po.order_date, po.currency_code,
+               po.status, po.total_amount, s.name as supplier_name, s.supplier_id
+        FROM purchase_orders po
+        JOIN suppliers s ON po.supplier_id = s.supplier_id
+        WHERE po.po_number {key_filter}
+        ORDER BY po.order_date DESC
+    """,
+}
+ARRAY_KEY_FILTER = "= ANY($1::text[])"
+TEMP_TABLE_KEY_FILTER = "IN (SELECT key FROM _lookup_keys)"
+
+# Server-side prepared statements, keyed by statement name.
+# Parameters use PostgreSQL's $1, $2, ... placeholders.
+PREPARED_STATEMENTS = {
+    "vendor_by_id": """
+        SELECT supplier_id, name, contact_email, phone, billing_address
+        FROM suppliers
+        WHERE supplier_id = $1
+    """,
+    "vendor_by_name": """
+        SELECT supplier_id, name, contact_email, phone, billing_address
+        FROM suppliers
+        WHERE name ILIKE $1
+        ORDER BY name
+        LIMIT $2
+    """,
+    "vendor_list": """
+        SELECT supplier_id, name, contact_email, phone, billing_address
+        FROM suppliers
+        ORDER BY name
+        LIMIT $1
+    """,
+    # Vendor row plus per-currency invoice and PO aggregates in one round-trip;
+    # invoice aggregates come pre-computed from vendor_invoice_summary
+    "vendor_summary": """
+        SELECT s.supplier_id, s.name, s.contact_email, s.phone,
+               (SELECT json_agg(inv) FROM (
+                    SELECT invoice_count, total_invoiced, total_paid,
+                           outstanding, currency_code
+                    FROM vendor_invoice_summary
+                    WHERE supplier_id = s.supplier_id
+               ) inv) AS invoice_stats,
+               (SELECT json_agg(po) FROM (
+                    SELECT 
+                        COUNT(*) as po_count,
+                        SUM(total_amount) as total_po_amount,
+                        currency_code
+                    FROM purchase_orders
+                    WHERE supplier_id = s.supplier_id
+                    GROUP BY currency_code
+               ) po) AS po_stats
+        FROM suppliers s
+        WHERE s.supplier_id = $1
+    """,
+    **{
+        name: query.format(key_filter=ARRAY_KEY_FILTER)
+        for name, query in MULTI_KEY_LOOKUPS.items()
+    },
+}
+
+# Above this many keys, multi-key lookups join against a temp table of keys
+# instead of passing one large array parameter
+BULK_LOOKUP_THRESHOLD = 100
+
+# Temp-table variants of the multi-key lookups; keys are loaded into _lookup_keys
+BULK_LOOKUP_QUERIES = {
+    name: query.format(key_filter=TEMP_TABLE_KEY_FILTER)
+    for name, query in MULTI_KEY_LOOKUPS.items()
+}
+
+
+class PreparingConnection(PGConnection):
+    """Connection that tracks which statements have been prepared on its backend."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """Return the shared connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(
+                POOL_MIN_CONN,
+                POOL_MAX_CONN,
+                connection_factory=PreparingConnection,
+                **DB_CONFIG,
+            )
+            atexit.register(_pool.closeall)
+        return _pool
+
+
 def get_db_connection():
-    """Create and return a database connection."""
-    return psycopg2.connect(**DB_CONFIG)
+    """Check out a database connection from the pool."""
+    return get_pool().getconn()
+
+
+def release_db_connection(conn) -> None:
+    """Return a connection to the pool."""
+    get_pool().putconn(conn)
 
 
 def query_db(query: str, params: tuple = ()) -> list[dict[str, Any]]:
     """Execute a query and return results as a list of dictionaries."""
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    conn = get_db_connection()
+    try:
+        # The connection context commits or rolls back without closing it
+        with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(query, params)
             return [dict(row) for row in cur.fetchall()]
+    finally:
+        release_db_connection(conn)
+
+
+def prepare_statements(conn: PreparingConnection, names: Iterable[str]) -> None:
+    """PREPARE any of the named statements that are not yet prepared on this connection."""
+    with conn.cursor() as cur:
+        for name in names:
+            if name not in conn.prepared:
+                cur.execute(f"PREPARE {name} AS {PREPARED_STATEMENTS[name]}")
+                conn.prepared.add(name)
+
+
+def warm_pool() -> None:
+    """Open the pool's minimum connections and prepare every statement on each."""
+    pool = get_pool()
+    # Hold all connections at once so each one is a distinct backend
+    conns = []
+    try:
+        for _ in range(POOL_MIN_CONN):
+            conns.append(pool.getconn())
+        for conn in conns:
+            with conn:
+                prepare_statements(conn, PREPARED_STATEMENTS)
+    finally:
+        for conn in conns:
+            pool.putconn(conn)
+
 
+def execute_prepared(name: str, params: tuple = ()) -> list[dict[str, Any]]:
+    """
+    Execute a statement from PREPARED_STATEMENTS and return results as dictionaries.
 
-def build_in_clause_query(base_query: str, values: list) -> tuple[str, tuple]:
+    The statement is prepared the first time it is used on a pooled connection,
+    so repeat calls skip parsing and planning on the server.
     """
-    Build a SQL query with IN clause from a base query and list of values.
-    
-    Args:
-        base_query: SQL query template with {placeholders} marker
-        values: List of values to include in the IN clause
-        
-    Returns:
-        Tuple of (formatted_query, values_tuple)
+    conn = get_db_connection()
+    try:
+        with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Prepared statements belong to the session and survive rollbacks
+            prepare_statements(conn, (name,))
+            if params:
+                placeholders = ", ".join(["%s"] * len(params))
+                cur.execute(f"EXECUTE {name} ({placeholders})", params)
+            else:
+                cur.execute(f"EXECUTE {name}")
+            return [dict(row) for row in cur.fetchall()]
+    finally:
+        release_db_connection(conn)
+
+
+def query_with_keys(name: str, keys: list[str]) -> list[dict[str, Any]]:
     """
-    placeholders = ",".join(["%s"] * len(values))
-    query = base_query.format(placeholders=placeholders)
-    return query, tuple(values)
+    Run a BULK_LOOKUP_QUERIES query against a temp table holding the given keys.
+
+    The keys are batch-inserted with execute_values so the lookup becomes a
+    semi-join, rather than one very large array parameter.
+    """
+    conn = get_db_connection()
+    try:
+        with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("CREATE TEMP TABLE _lookup_keys (key text PRIMARY KEY) ON COMMIT DROP")
+            execute_values(
+                cur,
+                "INSERT INTO _lookup_keys (key) VALUES %s ON CONFLICT DO NOTHING",
+                [(key,) for key in keys],
+            )
+            cur.execute(BULK_LOOKUP_QUERIES[name])
+            return [dict(row) for row in cur.fetchall()]
+    finally:
+        release_db_connection(conn)
+
+
+def stream_db(query: str, params: tuple = (), batch: int = 1000) -> Iterator[dict[str, Any]]:
+    """
+    Yield rows from a server-side (named) cursor, fetching `batch` rows at a time.
+
+    Only `batch` rows are held client-side at once, so large scans don't have
+    to be materialized before they are formatted.
+    """
+    conn = get_db_connection()
+    try:
+        # Named cursors need a transaction, which the connection context provides
+        with conn, conn.cursor(name="srv_cur", cursor_factory=RealDictCursor) as cur:
+            cur.itersize = batch
+            cur.execute(query, params)
+            yield from cur
+    finally:
+        release_db_connection(conn)
+
+
+async def _run_in_thread(func, *args):
+    """Run a blocking database call in a worker thread, bounded by the pool size."""
+    async with _pool_slots:
+        return await asyncio.to_thread(func, *args)
+
+
+async def execute_prepared_async(name: str, params: tuple = ()) -> list[dict[str, Any]]:
+    """Run execute_prepared in a worker thread so the event loop is not blocked."""
+    return await _run_in_thread(execute_prepared, name, params)
+
+
+async def lookup_by_keys_async(name: str, keys: list[str]) -> list[dict[str, Any]]:
+    """Run a multi-key lookup, switching to a temp-table join for large key lists."""
+    if len(keys) > BULK_LOOKUP_THRESHOLD:
+        return await _run_in_thread(query_with_keys, name, list(keys))
+    # A single array parameter keeps one plan for any number of keys
+    return await execute_prepared_async(name, (list(keys),))
+
+
+def row_limit(args: dict) -> int:
+    """Return the requested row limit, validating it."""
+    limit = args.get("limit", DEFAULT_ROW_LIMIT)
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+        raise ValueError(f"limit must be a positive integer, got {limit!r}")
+    return limit
+
+
+def response_format(args: dict) -> str:
+    """Return the requested response format, validating it."""
+    fmt = args.get("format", DEFAULT_RESPONSE_FORMAT)
+    if fmt not in RESPONSE_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    return fmt
+
+
+def json_response(payload: Any) -> list[TextContent]:
+    """Serialize a payload as compact JSON; Decimals are emitted as strings."""
+    return [TextContent(type="text", text=orjson.dumps(payload, default=str).decode())]
 
 
 # Create MCP server instance
 server = Server("postgres-lookup-server")
 
 
-@server.list_tools()
-async def handle_list_tools() -> list[Tool]:
-    """List available tools for querying the database."""
-    return [
-        Tool(
-            name="lookup_vendor",
-            description="Look up vendor/supplier information by name or ID. Returns vendor details including contact info and billing address.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "vendor_id": {
-                        "type": "integer",
-                        "description": "The vendor's ID number",
-                    },
-                    "name": {
-                        "type": "string",
-                        "description": "Search for vendor by name (partial match supported)",
-                    },
+# Shared "format" input accepted by every tool
+FORMAT_PROPERTY = {
+    "type": "string",
+    "enum": list(RESPONSE_FORMATS),
+    "description": "Response format: compact JSON (default) or human-readable text",
+}
+
+# Tool definitions are static, so build them once at import
+TOOLS = [
+    Tool(
+        name="lookup_vendor",
+        description="Look up vendor/supplier information by name or ID. Returns vendor details including contact info and billing address.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "format": FORMAT_PROPERTY,
+                "vendor_id": {
+                    "type": "integer",
+                    "description": "The vendor's ID number",
+                },
+                "name": {
+                    "type": "string",
+                    "description": "Search for vendor by name (partial match supported)",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": f"Maximum number of vendors to return (default {DEFAULT_ROW_LIMIT})",
+                    "minimum": 1,
                 },
             },
-        ),
-        Tool(
-            name="lookup_invoice",
-            description="Look up invoice information by invoice number(s). Can handle single invoice or list of invoice numbers. Returns invoice details including amounts, dates, and status.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "invoice_numbers": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "List of invoice numbers to look up",
-                    },
+        },
+    ),
+    Tool(
+        name="lookup_invoice",
+        description="Look up invoice information by invoice number(s). Can handle single invoice or list of invoice numbers. Returns invoice details including amounts, dates, and status.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "format": FORMAT_PROPERTY,
+                "invoice_numbers": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of invoice numbers to look up",
                 },
-                "required": ["invoice_numbers"],
             },
-        ),
-        Tool(
-            name="lookup_purchase_order",
-            description="Look up purchase order information by PO number(s). Can handle single PO or list of PO numbers. Returns PO details including amounts, dates, and status.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "po_numbers": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "List of purchase order numbers to look up",
-                    },
+            "required": ["invoice_numbers"],
+        },
+    ),
+    Tool(
+        name="lookup_purchase_order",
+        description="Look up purchase order information by PO number(s). Can handle single PO or list of PO numbers. Returns PO details including amounts, dates, and status.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "format": FORMAT_PROPERTY,
+                "po_numbers": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of purchase order numbers to look up",
                 },
-                "required": ["po_numbers"],
             },
-        ),
-        Tool(
-            name="query_amounts",
-            description="Query financial information including invoice amounts, payment amounts, and balances. Supports filtering by vendor, date range, and status.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "vendor_id": {
-                        "type": "integer",
-                        "description": "Filter by vendor ID",
-                    },
-                    "min_amount": {
-                        "type": "number",
-                        "description": "Minimum amount to filter",
-                    },
-                    "max_amount": {
-                        "type": "number",
-                        "description": "Maximum amount to filter",
-                    },
-                    "status": {
-                        "type": "string",
-                        "description": "Filter by status (e.g., PAID, APPROVED, DRAFT)",
-                    },
+            "required": ["po_numbers"],
+        },
+    ),
+    Tool(
+        name="query_amounts",
+        description="Query financial information including invoice amounts, payment amounts, and balances. Supports filtering by vendor, date range, and status.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "format": FORMAT_PROPERTY,
+                "vendor_id": {
+                    "type": "integer",
+                    "description": "Filter by vendor ID",
+                },
+                "min_amount": {
+                    "type": "number",
+                    "description": "Minimum amount to filter",
+                },
+                "max_amount": {
+                    "type": "number",
+                    "description": "Maximum amount to filter",
+                },
+                "status": {
+                    "type": "string",
+                    "description": "Filter by status (e.g., PAID, APPROVED, DRAFT)",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": f"Maximum number of invoices to return (default {DEFAULT_ROW_LIMIT})",
+                    "minimum": 1,
                 },
             },
-        ),
-        Tool(
-            name="get_vendor_summary",
-            description="Get summary information for a vendor including total invoices, total amounts, and payment status.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "vendor_id": {
-                        "type": "integer",
-                        "description": "The vendor's ID number",
-                    },
+        },
+    ),
+    Tool(
+        name="get_vendor_summary",
+        description="Get summary information for a vendor including total invoices, total amounts, and payment status.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "format": FORMAT_PROPERTY,
+                "vendor_id": {
+                    "type": "integer",
+                    "description": "The vendor's ID number",
                 },
-                "required": ["vendor_id"],
             },
-        ),
-    ]
+            "required": ["vendor_id"],
+        },
+    ),
+]
+
+
+@server.list_tools()
+async def handle_list_tools() -> list[Tool]:
+    """List available tools for querying the database."""
+    return TOOLS
 
 
 @server.call_tool()
@@ -158,18 +454,10 @@ async def handle_call_tool(name: str, arguments: dict | None) -> list[TextConten
         arguments = {}
 
     try:
-        if name == "lookup_vendor":
-            return await lookup_vendor(arguments)
-        elif name == "lookup_invoice":
-            return await lookup_invoice(arguments)
-        elif name == "lookup_purchase_order":
-            return await lookup_purchase_order(arguments)
-        elif name == "query_amounts":
-            return await query_amounts(arguments)
-        elif name == "get_vendor_summary":
-            return await get_vendor_summary(arguments)
-        else:
+        handler = TOOL_HANDLERS.get(name)
+        if handler is None:
             raise ValueError(f"Unknown tool: {name}")
+        return await handler(arguments)
     except Exception as e:
         return [TextContent(type="text", text=f"Error: {str(e)}")]
 
@@ -178,122 +466,103 @@ async def lookup_vendor(args: dict) -> list[TextContent]:
     """Look up vendor information."""
     vendor_id = args.get("vendor_id")
     name = args.get("name")
+    limit = row_limit(args)
+    fmt = response_format(args)
 
     if vendor_id:
-        query = """
-            SELECT supplier_id, name, contact_email, phone, 
-                   billing_address, created_at, updated_at
-            FROM suppliers
-            WHERE supplier_id = %s
-        """
-        results = query_db(query, (vendor_id,))
+        results = await execute_prepared_async("vendor_by_id", (vendor_id,))
     elif name:
-        query = """
-            SELECT supplier_id, name, contact_email, phone, 
-                   billing_address, created_at, updated_at
-            FROM suppliers
-            WHERE name ILIKE %s
-        """
-        results = query_db(query, (f"%{name}%",))
+        results = await execute_prepared_async("vendor_by_name", (f"%{name}%", limit))
     else:
         # Return all vendors if no filter provided
-        query = """
-            SELECT supplier_id, name, contact_email, phone, 
-                   billing_address, created_at, updated_at
-            FROM suppliers
-            ORDER BY name
-        """
-        results = query_db(query)
+        results = await execute_prepared_async("vendor_list", (limit,))
+
+    if fmt == "json":
+        return json_response(results)
 
     if not results:
         return [TextContent(type="text", text="No vendors found.")]
 
     # Format results
-    output = "Vendor Information:\n\n"
+    parts = ["Vendor Information:\n\n"]
     for vendor in results:
-        output += f"ID: {vendor['supplier_id']}\n"
-        output += f"Name: {vendor['name']}\n"
-        output += f"Email: {vendor['contact_email']}\n"
-        output += f"Phone: {vendor['phone']}\n"
-        output += f"Billing Address: {vendor['billing_address']}\n"
-        output += "-" * 50 + "\n"
+        parts.append(
+            f"ID: {vendor['supplier_id']}\n"
+            f"Name: {vendor['name']}\n"
+            f"Email: {vendor['contact_email']}\n"
+            f"Phone: {vendor['phone']}\n"
+            f"Billing Address: {vendor['billing_address']}\n{ROW_SEPARATOR}"
+        )
 
-    return [TextContent(type="text", text=output)]
+    return [TextContent(type="text", text="".join(parts))]
 
 
 async def lookup_invoice(args: dict) -> list[TextContent]:
     """Look up invoice information by invoice number(s)."""
     invoice_numbers = args.get("invoice_numbers", [])
+    fmt = response_format(args)
 
     if not invoice_numbers:
+        if fmt == "json":
+            return json_response([])
         return [TextContent(type="text", text="No invoice numbers provided.")]
 
-    base_query = """
-        SELECT i.invoice_id, i.invoice_number, i.invoice_date, i.due_date,
-               i.currency_code, i.status, i.subtotal_amount, i.tax_amount, 
-               i.total_amount, s.name as supplier_name, s.supplier_id,
-               po.po_number
-        FROM invoices i
-        JOIN suppliers s ON i.supplier_id = s.supplier_id
-        LEFT JOIN purchase_orders po ON i.po_id = po.po_id
-        WHERE i.invoice_number IN ({placeholders})
-        ORDER BY i.invoice_date DESC
-    """
-    query, params = build_in_clause_query(base_query, invoice_numbers)
-    results = query_db(query, params)
+    results = await lookup_by_keys_async("invoices_by_number", invoice_numbers)
+
+    if fmt == "json":
+        return json_response(results)
 
     if not results:
         return [TextContent(type="text", text="No invoices found.")]
 
     # Format results
-    output = "Invoice Information:\n\n"
+    parts = ["Invoice Information:\n\n"]
     for inv in results:
-        output += f"Invoice Number: {inv['invoice_number']}\n"
-        output += f"Supplier: {inv['supplier_name']} (ID: {inv['supplier_id']})\n"
-        output += f"PO Number: {inv['po_number'] or 'N/A'}\n"
-        output += f"Invoice Date: {inv['invoice_date']}\n"
-        output += f"Due Date: {inv['due_date']}\n"
-        output += f"Status: {inv['status']}\n"
-        output += f"Subtotal: {inv['currency_code']} {inv['subtotal_amount']}\n"
-        output += f"Tax: {inv['currency_code']} {inv['tax_amount']}\n"
-        output += f"Total Amount: {inv['currency_code']} {inv['total_amount']}\n"
-        output += "-" * 50 + "\n"
+        parts.append(
+            f"Invoice Number: {inv['invoice_number']}\n"
+            f"Supplier: {inv['supplier_name']} (ID: {inv['supplier_id']})\n"
+            f"PO Number: {inv['po_number'] or 'N/A'}\n"
+            f"Invoice Date: {inv['invoice_date']}\n"
+            f"Due Date: {inv['due_date']}\n"
+            f"Status: {inv['status']}\n"
+            f"Subtotal: {inv['currency_code']} {inv['subtotal_amount']}\n"
+            f"Tax: {inv['currency_code']} {inv['tax_amount']}\n"
+            f"Total Amount: {inv['currency_code']} {inv['total_amount']}\n{ROW_SEPARATOR}"
+        )
 
-    return [TextContent(type="text", text=output)]
+    return [TextContent(type="text", text="".join(parts))]
 
 
 async def lookup_purchase_order(args: dict) -> list[TextContent]:
     """Look up purchase order information by PO number(s)."""
     po_numbers = args.get("po_numbers", [])
+    fmt = response_format(args)
 
     if not po_numbers:
+        if fmt == "json":
+            return json_response([])
         return [TextContent(type="text", text="No purchase order numbers provided.")]
 
-    base_query = """
-        SELECT po.po_id, po.po_number, po.order_date, po.currency_code,
-               po.status, po.total_amount, s.name as supplier_name, s.supplier_id
-        FROM purchase_orders po
-        JOIN suppliers s ON po.supplier_id = s.supplier_id
-        WHERE po.po_number IN ({placeholders})
-        ORDER BY po.order_date DESC
-    """
-    query, params = build_in_clause_query(base_query, po_numbers)
-    results = query_db(query, params)
+    results = await lookup_by_keys_async("purchase_orders_by_number", po_numbers)
+
+    if fmt == "json":
+        return json_response(results)
 
     if not results:
         return [TextContent(type="text", text="No purchase orders found.")]
 
     # Format results
-    output = "Purchase Order Information:\n\n"
+    parts = ["Purchase Order Information:\n\n"]
     for po in results:
-        output += f"PO Number: {po['po_number']}\n"
-        output += f"Supplier: {po['supplier_name']} (ID: {po['supplier_id']})\n"
-        output += f"Order Date: {po['order_date']}\n"
-        output += f"Status: {po['status']}\n"
-        output += f"Total Amount: {po['currency_code']} {po['total_amount']}\n"
-        output += "-" * 50 + "\n"
+        parts.append(
+            f"PO Number: {po['po_number']}\n"
+            f"Supplier: {po['supplier_name']} (ID: {po['supplier_id']})\n"
+            f"Order Date: {po['order_date']}\n"
+            f"Status: {po['status']}\n"
+            f"Total Amount: {po['currency_code']} {po['total_amount']}\n{ROW_SEPARATOR}"
+        )
 
-    return [TextContent(type="text", text=output)]
+    return [TextContent(type="text", text="".join(parts))]
 
 
 async def query_amounts(args: dict) -> list[TextContent]:
@@ -302,6 +571,8 @@ async def query_amounts(args: dict) -> list[TextContent]:
     min_amount = args.get("min_amount")
     max_amount = args.get("max_amount")
     status = args.get("status")
+    limit = row_limit(args)
+    fmt = response_format(args)
 
     conditions = []
     params = []
@@ -321,117 +592,149 @@ async def query_amounts(args: dict) -> list[TextContent]:
 
     where_clause = " AND ".join(conditions) if conditions else "1=1"
 
+    # LIMIT is applied before the window function, so the USD total covers
+    # exactly the returned rows and the scan stops once the page is filled
     query = f"""
-        SELECT i.invoice_number, i.invoice_date, i.total_amount, 
-               i.currency_code, i.status, s.name as supplier_name,
-               ib.amount_paid, ib.balance_due
-        FROM invoices i
-        JOIN suppliers s ON i.supplier_id = s.supplier_id
-        LEFT JOIN invoice_balances ib ON i.invoice_id = ib.invoice_id
-        WHERE {where_clause}
-        ORDER BY i.invoice_date DESC
+        SELECT page.*,
+               SUM(CASE WHEN page.currency_code = 'USD' THEN page.total_amount ELSE 0 END) OVER () as usd_total
+        FROM (
+            SELECT i.invoice_number, i.invoice_date, i.total_amount, 
+                   i.currency_code, i.status, s.name as supplier_name,
+                   ib.amount_paid, ib.balance_due
+            FROM invoices i
+            JOIN suppliers s ON i.supplier_id = s.supplier_id
+            LEFT JOIN invoice_balances ib ON i.invoice_id = ib.invoice_id
+            WHERE {where_clause}
+            ORDER BY i.invoice_date DESC
+            LIMIT %s
+        ) page
+        ORDER BY page.invoice_date DESC
     """
-    results = query_db(query, tuple(params))
-
-    if not results:
+    params.append(limit)
+
+    if fmt == "json":
+        def collect_rows() -> tuple[list[dict[str, Any]], Any]:
+            """Collect streamed rows, splitting off the window-function USD total."""
+            rows = []
+            total = Decimal(0)
+            for inv in stream_db(query, tuple(params)):
+                total = inv.pop('usd_total')
+                rows.append(inv)
+            return rows, total
+
+        rows, total = await _run_in_thread(collect_rows)
+        return json_response({"invoices": rows, "usd_total": total})
+
+    def format_results() -> list[str]:
+        """Format rows as they stream in from the server-side cursor."""
+        parts = []
+        total = 0
+        for inv in stream_db(query, tuple(params)):
+            # Every row carries the same USD total of the returned rows
+            total = inv['usd_total']
+            parts.append(
+                f"Invoice: {inv['invoice_number']}\n"
+                f"Supplier: {inv['supplier_name']}\n"
+                f"Date: {inv['invoice_date']}\n"
+                f"Total: {inv['currency_code']} {inv['total_amount']}\n"
+                f"Paid: {inv['currency_code']} {inv['amount_paid'] or 0}\n"
+                f"Balance Due: {inv['currency_code']} {inv['balance_due'] or inv['total_amount']}\n"
+                f"Status: {inv['status']}\n{ROW_SEPARATOR}"
+            )
+        if parts:
+            parts.append(f"\nTotal (USD only): ${total:.2f}\n")
+        return parts
+
+    parts = await _run_in_thread(format_results)
+
+    if not parts:
         return [TextContent(type="text", text="No invoices found matching criteria.")]
 
-    # Format results
-    output = "Financial Query Results:\n\n"
-    total = 0
-    for inv in results:
-        output += f"Invoice: {inv['invoice_number']}\n"
-        output += f"Supplier: {inv['supplier_name']}\n"
-        output += f"Date: {inv['invoice_date']}\n"
-        output += f"Total: {inv['currency_code']} {inv['total_amount']}\n"
-        output += f"Paid: {inv['currency_code']} {inv['amount_paid'] or 0}\n"
-        output += f"Balance Due: {inv['currency_code']} {inv['balance_due'] or inv['total_amount']}\n"
-        output += f"Status: {inv['status']}\n"
-        output += "-" * 50 + "\n"
-        if inv['currency_code'] == 'USD':
-            total += float(inv['total_amount'])
-
-    output += f"\nTotal (USD only): ${total:.2f}\n"
-    return [TextContent(type="text", text=output)]
+    return [TextContent(type="text", text="Financial Query Results:\n\n" + "".join(parts))]
 
 
 async def get_vendor_summary(args: dict) -> list[TextContent]:
     """Get summary information for a vendor."""
     vendor_id = args.get("vendor_id")
+    fmt = response_format(args)
 
     if not vendor_id:
+        if fmt == "json":
+            return json_response(None)
         return [TextContent(type="text", text="Vendor ID is required.")]
 
-    # Get vendor info
-    vendor_query = """
-        SELECT supplier_id, name, contact_email, phone
-        FROM suppliers
-        WHERE supplier_id = %s
-    """
-    vendor_results = query_db(vendor_query, (vendor_id,))
+    results = await execute_prepared_async("vendor_summary", (vendor_id,))
 
-    if not vendor_results:
+    if not results:
+        if fmt == "json":
+            return json_response(None)
         return [TextContent(type="text", text="Vendor not found.")]
 
-    vendor = vendor_results[0]
-
-    # Get invoice summary
-    invoice_query = """
-        SELECT 
-            COUNT(*) as invoice_count,
-            SUM(total_amount) as total_invoiced,
-            SUM(CASE WHEN status = 'PAID' THEN total_amount ELSE 0 END) as total_paid,
-            currency_code
-        FROM invoices
-        WHERE supplier_id = %s
-        GROUP BY currency_code
-    """
-    invoice_stats = query_db(invoice_query, (vendor_id,))
-
-    # Get PO summary
-    po_query = """
-        SELECT 
-            COUNT(*) as po_count,
-            SUM(total_amount) as total_po_amount,
-            currency_code
-        FROM purchase_orders
-        WHERE supplier_id = %s
-        GROUP BY currency_code
-    """
-    po_stats = query_db(po_query, (vendor_id,))
+    vendor = results[0]
+    invoice_stats = vendor["invoice_stats"] or []
+    po_stats = vendor["po_stats"] or []
 
-    # Format results
-    output = f"Vendor Summary for: {vendor['name']}\n"
-    output += f"ID: {vendor['supplier_id']}\n"
-    output += f"Email: {vendor['contact_email']}\n"
-    output += f"Phone: {vendor['phone']}\n"
-    output += "=" * 50 + "\n\n"
+    if fmt == "json":
+        return json_response({
+            "vendor": {key: vendor[key] for key in ("supplier_id", "name", "contact_email", "phone")},
+            "invoice_summary": invoice_stats,
+            "po_summary": po_stats,
+        })
 
-    output += "Invoice Summary:\n"
+    # Format results
+    parts = [
+        f"Vendor Summary for: {vendor['name']}\n"
+        f"ID: {vendor['supplier_id']}\n"
+        f"Email: {vendor['contact_email']}\n"
+        f"Phone: {vendor['phone']}\n"
+        f"{HEADER_SEPARATOR}\n"
+        "Invoice Summary:\n"
+    ]
     if invoice_stats:
         for stat in invoice_stats:
-            output += f"  Currency: {stat['currency_code']}\n"
-            output += f"  Total Invoices: {stat['invoice_count']}\n"
-            output += f"  Total Invoiced: {stat['currency_code']} {stat['total_invoiced']}\n"
-            output += f"  Total Paid: {stat['currency_code']} {stat['total_paid']}\n"
-            output += f"  Outstanding: {stat['currency_code']} {float(stat['total_invoiced']) - float(stat['total_paid'])}\n"
+            parts.append(
+                f"  Currency: {stat['currency_code']}\n"
+                f"  Total Invoices: {stat['invoice_count']}\n"
+                f"  Total Invoiced: {stat['currency_code']} {stat['total_invoiced']}\n"
+                f"  Total Paid: {stat['currency_code']} {stat['total_paid']}\n"
+                f"  Outstanding: {stat['currency_code']} {stat['outstanding']}\n"
+            )
     else:
-        output += "  No invoices found.\n"
+        parts.append("  No invoices found.\n")
 
-    output += "\nPurchase Order Summary:\n"
+    parts.append("\nPurchase Order Summary:\n")
     if po_stats:
         for stat in po_stats:
-            output += f"  Currency: {stat['currency_code']}\n"
-            output += f"  Total POs: {stat['po_count']}\n"
-            output += f"  Total Amount: {stat['currency_code']} {stat['total_po_amount']}\n"
+            parts.append(
+                f"  Currency: {stat['currency_code']}\n"
+                f"  Total POs: {stat['po_count']}\n"
+                f"  Total Amount: {stat['currency_code']} {stat['total_po_amount']}\n"
+            )
     else:
-        output += "  No purchase orders found.\n"
+        parts.append("  No purchase orders found.\n")
 
-    return [TextContent(type="text", text=output)]
+    return [TextContent(type="text", text="".join(parts))]
+
+
+# Tool name to handler dispatch table used by handle_call_tool
+TOOL_HANDLERS = {
+    "lookup_vendor": lookup_vendor,
+    "lookup_invoice": lookup_invoice,
+    "lookup_purchase_order": lookup_purchase_order,
+    "query_amounts": query_amounts,
+    "get_vendor_summary": get_vendor_summary,
+}
 
 
 async def main():
     """Main entry point for the MCP server."""
+    # Open pooled connections and prepare statements before the first tool call;
+    # if the database is unavailable, start anyway and let tool calls report it
+    try:
+        await _run_in_thread(warm_pool)
+    except psycopg2.Error as e:
+        print(f"Database warm-up failed: {e}", file=sys.stderr)
+
     async with stdio_server() as (read_stream, write_stream):
         await server.run(
             read_stream,
@@ -20,7 +20,7 @@ def test_connection():
     print("Testing database connection...")
     try:
         conn = get_db_connection()
-        conn.close()
+        release_db_connection(conn)
         print("✅ Database connection successful")
         return True
     except Exception as e:
@@ -113,20 +113,90 @@ def test_views():
         result = query_db(query)
         count = result[0]['count']
         print(f"✅ supplier_open_balances view has {count} records")
+
+        query = "SELECT COUNT(*) as count FROM vendor_invoice_summary"
+        result = query_db(query)
+        count = result[0]['count']
+        print(f"✅ vendor_invoice_summary table has {count} records")
+
+        # The trigger-maintained summary must match a fresh aggregate of invoices
+        query = """
+            SELECT COUNT(*) as count FROM (
+                (SELECT supplier_id, currency_code, invoice_count, total_invoiced, total_paid
+                 FROM vendor_invoice_summary
+                 EXCEPT
+                 SELECT supplier_id, currency_code, COUNT(*), SUM(total_amount),
+                        SUM(CASE WHEN status = 'PAID' THEN total_amount ELSE 0 END)
+                 FROM invoices GROUP BY supplier_id, currency_code)
+                UNION ALL
+                (SELECT supplier_id, currency_code, COUNT(*), SUM(total_amount),
+                        SUM(CASE WHEN status = 'PAID' THEN total_amount ELSE 0 END)
+                 FROM invoices GROUP BY supplier_id, currency_code
+                 EXCEPT
+                 SELECT supplier_id, currency_code, invoice_count, total_invoiced, total_paid
+                 FROM vendor_invoice_summary)
+            ) diff
+        """
+        result = query_db(query)
+        if result[0]['count']:
+            print(f"❌ vendor_invoice_summary differs from invoices in {result[0]['count']} rows")
+            return False
+        print("✅ vendor_invoice_summary matches invoice aggregates")
         return True
     except Exception as e:
         print(f"❌ View query failed: {e}")
         return False
 
 
+def test_bulk_lookup():
+    """Test that the temp-table lookup path matches the array-parameter path."""
+    print("\nTesting bulk multi-key lookups...")
+    try:
+        lookups = [
+            ("invoices_by_number", "SELECT invoice_number AS key FROM invoices", "invoice_id"),
+            ("purchase_orders_by_number", "SELECT po_number AS key FROM purchase_orders", "po_id"),
+        ]
+        all_passed = True
+        for name, key_query, id_column in lookups:
+            existing = [row['key'] for row in query_db(key_query)]
+            # Duplicates and unknown numbers, enough to exceed the bulk threshold
+            keys = existing + existing + [f"MISSING-{n}" for n in range(BULK_LOOKUP_THRESHOLD)]
+
+            array_rows = execute_prepared(name, (keys,))
+            bulk_rows = query_with_keys(name, keys)
+            array_rows.sort(key=lambda row: row[id_column])
+            bulk_rows.sort(key=lambda row: row[id_column])
+
+            if bulk_rows == array_rows and len(bulk_rows) == len(existing):
+                print(f"✅ {name}: {len(keys)} keys matched {len(bulk_rows)} rows on both paths")
+            else:
+                print(f"❌ {name}: temp-table path returned {len(bulk_rows)} rows, array path {len(array_rows)}")
+                all_passed = False
+        return all_passed
+    except Exception as e:
+        print(f"❌ Bulk lookup failed: {e}")
+        return False
+
+
 def main():
     """Run all tests."""
     # Import server module after environment variables are set
-    from server import get_db_connection, query_db
+    from server import (
+        BULK_LOOKUP_THRESHOLD,
+        execute_prepared,
+        get_db_connection,
+        query_db,
+        query_with_keys,
+        release_db_connection,
+    )
     
     # Make functions available globally for test functions
     globals()['get_db_connection'] = get_db_connection
+    globals()['release_db_connection'] = release_db_connection
     globals()['query_db'] = query_db
+    globals()['execute_prepared'] = execute_prepared
+    globals()['query_with_keys'] = query_with_keys
+    globals()['BULK_LOOKUP_THRESHOLD'] = BULK_LOOKUP_THRESHOLD
     
     print("=" * 60)
     print("MCP Server Database Connectivity Test")
@@ -138,6 +208,7 @@ def main():
         test_invoice_lookup,
         test_po_lookup,
         test_views,
+        test_bulk_lookup,
     ]
     
     passed = 0
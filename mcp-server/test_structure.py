@@ -18,7 +18,7 @@ def test_imports():
         return True
     except ImportError as e:
         # Expected if dependencies are not installed
-        if any(pkg in str(e) for pkg in ["mcp", "psycopg2"]):
+        if any(pkg in str(e) for pkg in ["mcp", "orjson", "psycopg2"]):
             print(f"⚠️  Dependencies not installed (expected in CI): {e}")
             print("   Install with: pip install -r requirements.txt")
             return True